@@ -4,10 +4,17 @@ from dotenv import load_dotenv
 load_dotenv()
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 STATIC_DIR = os.path.abspath(os.path.join(PROJECT_ROOT, "..", "frontend"))
+# Output of build_static.py; when present it is served instead of STATIC_DIR
+STATIC_BUILD_DIR = os.path.abspath(os.path.join(PROJECT_ROOT, "static_dist"))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MURF_API_KEY = os.getenv("MURF_API_KEY")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+# Directory for per-session record/replay logs; recording is off when unset
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR")
+# Durable chat history and how long dropped sessions stay resumable
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_GRACE_SECONDS = float(os.getenv("SESSION_GRACE_SECONDS", "60"))
 
 
 
@@ -1,23 +1,38 @@
 import os
+import json
 import asyncio
 import tempfile
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from dotenv import load_dotenv
-from app.core.config import STATIC_DIR
+from app.core.config import STATIC_DIR, STATIC_BUILD_DIR, SESSION_RECORD_DIR, SESSION_DB_PATH, SESSION_GRACE_SECONDS
 from app.services.stt_service import STTService
 from app.services.llm_service import LLMService
-from app.routers.transcriber import AssemblyAIStreamingTranscriber
+from app.routers.transcriber import AssemblyAIStreamingTranscriber, config_signature
+from app.services.static_assets import PrecompressedStaticFiles
+from app.services.session_recorder import RecordKind, SessionRecorder, redact_config
+from app.services.session_store import ConversationStore, SessionRegistry, new_session_token
 
 # === Load environment variables ===
 load_dotenv()
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# === Session state ===
+conversation_store = ConversationStore(SESSION_DB_PATH)
+session_registry = SessionRegistry(SESSION_GRACE_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    session_registry.close_all()
+    conversation_store.close()
+
 # === FastAPI setup ===
-app = FastAPI(title="Voice Agent")
+app = FastAPI(title="Voice Agent", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -28,11 +43,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+if os.path.isfile(os.path.join(STATIC_BUILD_DIR, "manifest.json")):
+    static_files = PrecompressedStaticFiles(directory=STATIC_BUILD_DIR)
+    app.mount("/static", static_files, name="static")
+
+    @app.get("/")
+    async def get_index(request: Request):
+        return await static_files.get_response("index.html", request.scope)
+else:
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+    @app.get("/")
+    async def get_index():
+        return FileResponse(os.path.join(STATIC_DIR, "index.html"))
 
-@app.get("/")
-async def get_index():
-    return FileResponse("static/index.html")
+async def open_session(websocket: WebSocket, loop, recorder, config_data: dict):
+    """
+    Take over a warm session (parked, or still live on a socket the server
+    has not noticed is dead), or build a new one, restoring stored history
+    when the resume token is known. Returns (transcriber, resumed).
+    """
+    token = config_data.get("resume_token")
+    previous = session_registry.claim(token)
+    if previous:
+        await previous.detach()
+        if previous.config_signature == config_signature(config_data):
+            print("♻️ Resuming warm session.")
+            previous.attach(websocket, loop, recorder)
+            return previous, True
+        # Keys or audio format changed: the warm clients are for the old config
+        print("🔑 Config changed since the session was parked. Rebuilding services.")
+        previous.close()
+
+    history = await asyncio.to_thread(conversation_store.load_history, token) if token else []
+    transcriber = AssemblyAIStreamingTranscriber(
+        websocket, loop,
+        recorder=recorder,
+        store=conversation_store,
+        session_token=token if history or previous else new_session_token(),
+    )
+    print("🔑 Received config message. Initializing services...")
+    await transcriber.initialize_services(config_data)
+    transcriber.restore_history(history)
+    return transcriber, bool(history)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -40,23 +93,51 @@ async def websocket_endpoint(websocket: WebSocket):
     print("🎤 Client connected")
 
     loop = asyncio.get_running_loop()
-    transcriber = AssemblyAIStreamingTranscriber(websocket, loop)
+    # Opt-in session log for offline replay (see replay_session.py)
+    recorder = SessionRecorder.for_new_session(SESSION_RECORD_DIR) if SESSION_RECORD_DIR else None
+    transcriber = None
 
     try:
         # Step 1: Receive the config message first (JSON)
         # This is the crucial change to get the API keys from the frontend
         config_data = await websocket.receive_json()
+        if recorder:
+            recorder.record_json(RecordKind.INBOUND_MESSAGE, redact_config(config_data))
         if config_data.get("type") == "config":
-            print("🔑 Received config message. Initializing services...")
-            await transcriber.initialize_services(config_data)
+            transcriber, resumed = await open_session(websocket, loop, recorder, config_data)
+            session_registry.register(transcriber.session_token, transcriber)
+            await transcriber.send_json({"type": "session", "token": transcriber.session_token, "resumed": resumed})
         else:
             await websocket.close(code=1008, reason="First message must be config.")
             return
 
-        # Step 2: Handle incoming audio data (bytes)
+        # Step 2: Handle incoming audio data (bytes) and client control messages (JSON)
         # Now we enter the loop to receive the audio stream
         while True:
-            data = await websocket.receive_bytes()
+            message = await websocket.receive()
+            if transcriber.websocket is not websocket:
+                print("🔀 Session taken over by a newer connection.")
+                break
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("text") is not None:
+                if recorder:
+                    recorder.record_text(RecordKind.INBOUND_MESSAGE, message["text"])
+                try:
+                    client_message = json.loads(message["text"])
+                except ValueError:
+                    print("⚠️ Ignoring malformed client message.")
+                    continue
+                if isinstance(client_message, dict):
+                    transcriber.handle_client_message(client_message)
+                else:
+                    print("⚠️ Ignoring non-object client message.")
+                continue
+
+            data = message.get("bytes")
+            if recorder:
+                recorder.record(RecordKind.INBOUND_AUDIO, data)
             if transcriber.client:
                 transcriber.stream_audio(data)
             else:
@@ -68,6 +149,12 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"❌ An error occurred: {e}")
     finally:
-        print("🧹 Cleaning up transcriber resources.")
-        transcriber.close()
+        # A session taken over by a reconnect belongs to the new socket now
+        if transcriber and transcriber.websocket is websocket:
+            # Keep provider clients warm so a reconnect with the token can resume
+            print("🧹 Parking session; provider clients close after the grace period.")
+            transcriber.flush_audio()
+            session_registry.park(transcriber.session_token, transcriber, loop)
+        if recorder:
+            recorder.close()
         
\ No newline at end of file
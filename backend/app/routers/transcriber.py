@@ -1,6 +1,7 @@
 import os
 import re
 import asyncio
+import base64
 import json
 import websockets
 from fastapi import WebSocket
@@ -12,7 +13,20 @@ from assemblyai.streaming.v3 import (
     TerminationEvent, StreamingError
 )
 from app.services.llm_service import LLMService
+from app.services.audio_service import TTSAudioEncoder, negotiate_audio_format
+from app.services.session_recorder import RecordKind, SessionRecorder, redact_outbound
+from app.services.session_store import ConversationStore
 from tavily import TavilyClient
+from typing import Optional
+
+# Mic audio arrives as 16 kHz PCM16 frames of 20-50 ms; AssemblyAI rejects
+# chunks shorter than 50 ms, so smaller frames are coalesced before sending.
+AAI_SAMPLE_RATE = 16000
+AAI_MIN_CHUNK_BYTES = AAI_SAMPLE_RATE * 2 * 50 // 1000
+
+# Close code for a socket whose session was resumed by another connection;
+# the client must not reconnect on it, or two tabs keep taking it from each other.
+SESSION_TAKEN_OVER_CODE = 4001
 
 # Global services, initialized with None to be configured later
 llm_service = None
@@ -125,14 +139,35 @@ async def fetch_ai_ml_news():
         print("❌ Tavily error:", e)
         return "Sorry yaar, AI/ML news fetch karne mein gadbad ho gayi.", []
 
+def config_signature(config_data: dict) -> tuple:
+    """Provider keys and audio format a session is built from; resume only reuses an exact match."""
+    return (
+        config_data.get("aai_key"),
+        config_data.get("murf_key"),
+        config_data.get("tavily_key"),
+        config_data.get("gemini_key"),
+        negotiate_audio_format(config_data),
+    )
+
 # === Main Class ===
 class AssemblyAIStreamingTranscriber:
-    def __init__(self, websocket: WebSocket, loop):
+    def __init__(
+        self,
+        websocket: WebSocket,
+        loop,
+        recorder: Optional[SessionRecorder] = None,
+        store: Optional[ConversationStore] = None,
+        session_token: Optional[str] = None,
+    ):
         self.websocket = websocket
         self.loop = loop
+        self.recorder = recorder
+        self.store = store
+        self.session_token = session_token
+        self.response_future = None # Pipeline for the latest final turn
+        self.tts_task = None # Murf receive task of that pipeline
         self.murf_ws = None
         self.chat_history: list[dict] = []
-        self.murf_chunk_counter = 0
         self.client = None
         self.llm_service = None
         self.tavily_client = None
@@ -140,13 +175,20 @@ class AssemblyAIStreamingTranscriber:
         self.murf_api_key = None
         self.tavily_api_key = None
         self.gemini_api_key = None
-        self.murf_context_id = None # Store Murf context_id
+        self.audio_format = None # (sample_rate, codec) negotiated with the client
+        self.config_signature = None # See config_signature()
+        self.audio_buffer = bytearray()
+        self.playback_underruns = 0
 
     async def initialize_services(self, config_data: dict):
         self.aai_api_key = config_data.get("aai_key")
         self.murf_api_key = config_data.get("murf_key")
         self.tavily_api_key = config_data.get("tavily_key")
         self.gemini_api_key = config_data.get("gemini_key")
+        self.audio_format = negotiate_audio_format(config_data)
+        self.config_signature = config_signature(config_data)
+        if self.audio_format:
+            print(f"DEBUG: TTS audio delivered as {self.audio_format[1]} @ {self.audio_format[0]} Hz.")
 
         if self.gemini_api_key:
             global llm_service
@@ -172,7 +214,7 @@ class AssemblyAIStreamingTranscriber:
                 self.client.on(StreamingEvents.Turn, self.on_turn_event)
                 self.client.on(StreamingEvents.Termination, self.on_termination_event)
                 self.client.on(StreamingEvents.Error, self.on_error_event)
-                self.client.connect(StreamingParameters(sample_rate=16000, format_turns=False))
+                self.client.connect(StreamingParameters(sample_rate=AAI_SAMPLE_RATE, format_turns=False))
                 print("✅ AAI client initialized.")
             except Exception as e:
                 print(f"❌ AAI client initialization error: {e}")
@@ -180,17 +222,57 @@ class AssemblyAIStreamingTranscriber:
         else:
             print("❌ AssemblyAI API key not provided.")
 
+    def attach(self, websocket: WebSocket, loop, recorder: Optional[SessionRecorder] = None):
+        """Reattach a parked session to a new browser connection, keeping provider clients."""
+        self.websocket = websocket
+        self.loop = loop
+        self.recorder = recorder
+        self.audio_buffer.clear()
+        print("DEBUG: Session reattached to new WebSocket.")
+
+    async def detach(self):
+        """
+        Take the session away from its current socket, closing it. A live
+        session's socket may be dead without the server having noticed yet.
+        """
+        websocket, self.websocket = self.websocket, None
+        if websocket is not None:
+            try:
+                await websocket.close(code=SESSION_TAKEN_OVER_CODE, reason="Session resumed elsewhere.")
+            except Exception:
+                pass
+
+    def restore_history(self, history: list[dict]):
+        if history:
+            self.chat_history.extend(history)
+            print(f"DEBUG: Restored {len(history)} chat history messages.")
+
     def on_begin_event(self, client, event: BeginEvent):
         print(f"🎤 Session started: {event.id}")
 
     def on_turn_event(self, client, event: TurnEvent):
+        if self.recorder:
+            self.recorder.record_json(RecordKind.TURN_EVENT, {
+                "transcript": event.transcript,
+                "end_of_turn": event.end_of_turn,
+                "turn_is_formatted": event.turn_is_formatted,
+            })
         if event.end_of_turn and event.transcript.strip():
+            if self.response_future and not self.response_future.done():
+                # The user spoke over the previous reply: cancel it and cut client playback
+                print("DEBUG: New turn while previous response is running. Interrupting it.")
+                self.response_future.cancel()
+                # The receive task is separate from the pipeline and would outlive it
+                tts_task = self.tts_task
+                if tts_task:
+                    self.loop.call_soon_threadsafe(tts_task.cancel)
+                asyncio.run_coroutine_threadsafe(self.send_json({"type": "stop_audio"}), self.loop)
             print(f"DEBUG: Transcription complete. Sending transcript to frontend: '{event.transcript}'")
             asyncio.run_coroutine_threadsafe(
-                self.websocket.send_json({"type": "transcript", "text": event.transcript}),
+                self.send_json({"type": "transcript", "text": event.transcript}),
                 self.loop
             )
-            asyncio.run_coroutine_threadsafe(
+            self.response_future = asyncio.run_coroutine_threadsafe(
                 self.stream_llm_to_murf(event.transcript),
                 self.loop
             )
@@ -198,23 +280,39 @@ class AssemblyAIStreamingTranscriber:
                 client.set_params(StreamingSessionParameters(format_turns=True))
                 print("DEBUG: Setting AAI session to format turns.")
 
-    async def _ensure_murf(self):
-        print("DEBUG: Checking Murf WebSocket connection.")
+    async def send_json(self, message: dict):
+        if self.recorder:
+            self.recorder.record_json(RecordKind.OUTBOUND, redact_outbound(message))
+        await self.websocket.send_json(message)
+
+    async def connect_murf(self, url: str):
+        return await websockets.connect(url)
+
+    async def fetch_news(self):
+        final_text, links = await fetch_ai_ml_news()
+        if self.recorder:
+            self.recorder.record_json(RecordKind.NEWS_RESULT, {"text": final_text, "links": links})
+        return final_text, links
+
+    async def _open_murf_stream(self):
+        """
+        Open a Murf socket for one reply. Each reply owns its socket and
+        context id, so an interrupted reply can't read the next one's audio.
+        """
+        print("DEBUG: Opening Murf WebSocket.")
         if not self.murf_api_key:
             print("❌ Murf API key is not set.")
-            return False
+            return None, None
+        murf_ws = None
         try:
-            if self.murf_ws and not self.murf_ws.close:
-                print("DEBUG: Murf WS already open.")
-                return True
-            
             murf_url = f"wss://api.murf.ai/v1/speech/stream-input?api-key={self.murf_api_key}"
-            self.murf_ws = await websockets.connect(murf_url)
+            murf_ws = await self.connect_murf(murf_url)
+            self.murf_ws = murf_ws
             print("✅ Murf WebSocket connected.")
-            
-            # Use a new context ID for each session
-            self.murf_context_id = f"rancho-session-{os.urandom(16).hex()}"
-            await self.murf_ws.send(json.dumps({
+
+            # Use a new context ID for each reply
+            context_id = f"rancho-session-{os.urandom(16).hex()}"
+            await murf_ws.send(json.dumps({
                 "voice_config": {
                     "voiceId": "en-IN-eashwar",
                     "style": "Conversational",
@@ -225,27 +323,32 @@ class AssemblyAIStreamingTranscriber:
                     "format": "WAV",
                     "channelType": "MONO",
                 },
-                "context_id": self.murf_context_id
+                "context_id": context_id
             }))
             print("DEBUG: Murf voice config and context_id sent.")
-            return True
+            return murf_ws, context_id
+        except asyncio.CancelledError:
+            if murf_ws:
+                await murf_ws.close()
+            raise
         except Exception as e:
             print(f"❌ Could not init Murf WS: {e}")
-            self.murf_ws = None
-            self.murf_context_id = None
-            return False
+            if murf_ws:
+                await murf_ws.close()
+            return None, None
 
     async def stream_llm_to_murf(self, user_text: str):
         print(f"DEBUG: Starting LLM to Murf stream for user text: '{user_text}'")
         if not self.llm_service:
-            await self.websocket.send_json({"type": "llm_text_final", "text": "Sorry, Gemini service is not configured.", "links_pending": False})
+            await self.send_json({"type": "llm_text_final", "text": "Sorry, Gemini service is not configured.", "links_pending": False})
             return
 
+        tts_task = None
         try:
-            tts_ready = await self._ensure_murf()
-            tts_task = None
-            if tts_ready:
-                tts_task = asyncio.create_task(self.receive_audio_from_murf())
+            murf_ws, context_id = await self._open_murf_stream()
+            if murf_ws:
+                tts_task = asyncio.create_task(self.receive_audio_from_murf(murf_ws))
+                self.tts_task = tts_task
                 print("DEBUG: Created Murf audio receive task.")
 
             final_text = ""
@@ -253,8 +356,8 @@ class AssemblyAIStreamingTranscriber:
 
             if any(k in user_text.lower() for k in ["ai news", "ml news", "tech news", "latest ai", "latest ml"]):
                 print("DEBUG: User asked for news. Fetching news.")
-                final_text, links = await fetch_ai_ml_news()
-                await self.websocket.send_json({
+                final_text, links = await self.fetch_news()
+                await self.send_json({
                     "type": "llm_text_final",
                     "text": final_text,
                     "links_pending": bool(links)
@@ -263,7 +366,7 @@ class AssemblyAIStreamingTranscriber:
                 if links:
                     safe_links = [{"title": l.get("title", "News"), "url": l.get("url", "#")} for l in links]
                     try:
-                        await self.websocket.send_json({"type": "related_links", "links": safe_links})
+                        await self.send_json({"type": "related_links", "links": safe_links})
                         print("DEBUG: Sent related links to frontend.")
                     except Exception as e:
                         print("❌ Error sending related_links:", e)
@@ -278,8 +381,10 @@ class AssemblyAIStreamingTranscriber:
                         if not chunk:
                             continue
                         full_text.append(chunk)
+                        if self.recorder:
+                            self.recorder.record_text(RecordKind.LLM_CHUNK, chunk)
                         try:
-                            await self.websocket.send_json({"type": "llm_text", "text": chunk})
+                            await self.send_json({"type": "llm_text", "text": chunk})
                         except Exception:
                             pass
                 except Exception as e:
@@ -287,29 +392,29 @@ class AssemblyAIStreamingTranscriber:
                 
                 final_text = enforce_word_limit("".join(full_text).strip(), 100)
                 print("DEBUG: LLM stream complete. Final text length:", len(final_text))
-                await self.websocket.send_json({
+                await self.send_json({
                     "type": "llm_text_final",
                     "text": final_text,
                     "links_pending": False
                 })
                 print("DEBUG: Sent LLM final text to frontend.")
 
-            if tts_ready and final_text:
+            if murf_ws and final_text:
                 print(f"DEBUG: Sending text to Murf for TTS. Final text length: {len(final_text)}")
                 tts_chunks = split_into_chunks(clean_text_for_tts(final_text))
                 for i, tts_chunk in enumerate(tts_chunks):
                     print(f"DEBUG: Sending TTS chunk {i+1} to Murf: '{tts_chunk}'")
                     # Send each chunk with the context_id
-                    await self.murf_ws.send(json.dumps({
+                    await murf_ws.send(json.dumps({
                         "text": tts_chunk, 
                         "end": False,
-                        "context_id": self.murf_context_id
+                        "context_id": context_id
                     }))
                 # Send a final empty message to signal the end of the TTS stream
-                await self.murf_ws.send(json.dumps({
+                await murf_ws.send(json.dumps({
                     "text": "", 
                     "end": True, 
-                    "context_id": self.murf_context_id
+                    "context_id": context_id
                 }))
                 print("DEBUG: Sent final TTS chunk to Murf.")
 
@@ -321,23 +426,31 @@ class AssemblyAIStreamingTranscriber:
             if final_text:
                 self.chat_history.append({"role": "user", "parts": [{"text": user_text}]})
                 self.chat_history.append({"role": "model", "parts": [{"text": final_text}]})
+                if self.store and self.session_token:
+                    self.store.append(self.session_token, "user", user_text)
+                    self.store.append(self.session_token, "model", final_text)
                 print("DEBUG: Chat history updated.")
 
         except Exception as e:
             print("❌ Error in stream_llm_to_murf:", e)
             try:
-                await self.websocket.send_json({"type": "llm_text_final", "text": "[Error generating response]", "links_pending": False})
+                await self.send_json({"type": "llm_text_final", "text": "[Error generating response]", "links_pending": False})
             except Exception:
                 pass
         finally:
+            if tts_task and not tts_task.done():
+                # Only reached when this pipeline was cancelled by a newer turn
+                tts_task.cancel()
             print("DEBUG: stream_llm_to_murf completed.")
 
-    async def receive_audio_from_murf(self):
+    async def receive_audio_from_murf(self, murf_ws):
         print("DEBUG: Started receiving audio from Murf.")
+        encoder = TTSAudioEncoder(*self.audio_format) if self.audio_format else None
+        chunk_id = 0
         try:
             while True:
                 try:
-                    msg = await asyncio.wait_for(self.murf_ws.recv(), timeout=60.0)
+                    msg = await asyncio.wait_for(murf_ws.recv(), timeout=60.0)
                     if not msg:
                         print("DEBUG: Received empty message from Murf, assuming stream is complete.")
                         break
@@ -346,17 +459,24 @@ class AssemblyAIStreamingTranscriber:
 
                     
                     if "audio" in data:
-                        self.murf_chunk_counter += 1
-                        print(f"DEBUG: Received audio chunk {self.murf_chunk_counter} from Murf.")
-                        await self.websocket.send_json({
-                            "type": "ai_audio",
-                            "chunk_id": self.murf_chunk_counter,
-                            "audio": data["audio"],
-                            "final": False
-                        })
+                        chunk_id += 1
+                        if self.recorder:
+                            self.recorder.record(RecordKind.MURF_AUDIO, base64.b64decode(data["audio"]))
+                        print(f"DEBUG: Received audio chunk {chunk_id} from Murf.")
+                        if encoder:
+                            await self.send_encoded_audio(encoder, chunk_id, encoder.encode_b64(data["audio"]))
+                        else:
+                            await self.send_json({
+                                "type": "ai_audio",
+                                "chunk_id": chunk_id,
+                                "audio": data["audio"],
+                                "final": False
+                            })
                     
                     # FIX: Use the correct key from Murf docs and add a safety check for 'final'
                     if data.get("isFinalAudio") or data.get("final"):
+                        if self.recorder:
+                            self.recorder.record(RecordKind.MURF_FINAL)
                         print("DEBUG: Received final message from Murf. Stream Complete")
                         break
                 
@@ -369,29 +489,69 @@ class AssemblyAIStreamingTranscriber:
                 except Exception as e:
                     print(f"Murf receive error: {e}")
                     break
-            
-            await self.websocket.send_json({"type": "ai_audio", "final": True})
+
+            if encoder:
+                # Emit the resampler's filter tail
+                await self.send_encoded_audio(encoder, chunk_id, encoder.flush_b64())
+            await self.send_json({"type": "ai_audio", "final": True})
             print("DEBUG: Sent final audio message to frontend.")
-            self.murf_chunk_counter = 0
 
         except Exception as e:
             print(f"❌ Murf receive error: {e}")
         finally:
-            if self.murf_ws and not self.murf_ws.close:
+            # Also reached when an interrupting turn cancels this task
+            if self.murf_ws is murf_ws:
+                self.murf_ws = None
+            if murf_ws.close_code is None:
                 print("DEBUG: Closing Murf WebSocket.")
-                await self.murf_ws.close()
-            self.murf_ws = None
+                await murf_ws.close()
             print("DEBUG: Murf audio receive task completed.")
             
+    async def send_encoded_audio(self, encoder: TTSAudioEncoder, chunk_id: int, audio_b64: str):
+        if not audio_b64:
+            return
+        await self.send_json({
+            "type": "ai_audio",
+            "chunk_id": chunk_id,
+            "audio": audio_b64,
+            "codec": encoder.codec,
+            "sample_rate": encoder.sample_rate,
+            "final": False
+        })
+
     def stream_audio(self, audio_chunk: bytes):
         if self.client:
-            try:
-                self.client.stream(audio_chunk)
-            except Exception as e:
-                print("❌ Error sending audio:", e)
+            self.audio_buffer.extend(audio_chunk)
+            if len(self.audio_buffer) >= AAI_MIN_CHUNK_BYTES:
+                self.flush_audio()
         else:
             print("AAI client not initialized. Cannot stream audio.")
 
+    def flush_audio(self):
+        """Send whatever mic audio is still buffered, e.g. before the socket goes away."""
+        if not self.client or not self.audio_buffer:
+            return
+        chunk = bytes(self.audio_buffer)
+        self.audio_buffer.clear()
+        try:
+            self.client.stream(chunk)
+        except Exception as e:
+            print("❌ Error sending audio:", e)
+
+    def handle_client_message(self, message: dict):
+        if message.get("type") == "playback_stats":
+            underruns = message.get("underruns", 0)
+            if not isinstance(underruns, int):
+                print("⚠️ Ignoring playback_stats with invalid underruns.")
+                return
+            if underruns > self.playback_underruns:
+                print(f"⚠️ Client playback underrun #{underruns} (jitter target {message.get('target_ms')} ms).")
+            elif message.get("event") == "drained":
+                print(f"DEBUG: Client playback drained. Underruns so far: {underruns}.")
+            self.playback_underruns = underruns
+        else:
+            print(f"DEBUG: Ignoring client message of type {message.get('type')!r}.")
+
     def on_termination_event(self, client, event: TerminationEvent):
         print(f"🛑 Session terminated after {event.audio_duration_seconds}s")
 
@@ -399,12 +559,13 @@ class AssemblyAIStreamingTranscriber:
         print("❌ Streaming error:", error)
 
     async def close_murf(self):
-        if self.murf_ws and not self.murf_ws.close:
+        if self.murf_ws and self.murf_ws.close_code is None:
             await self.murf_ws.close()
             self.murf_ws = None
             print("DEBUG: Murf WS closed.")
 
     def close(self):
+        self.flush_audio()
         if self.client:
             self.client.disconnect(terminate=True)
             self.client = None
@@ -0,0 +1,265 @@
+import base64
+import logging
+import struct
+from math import gcd
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Murf is asked for 44.1 kHz mono WAV; speech does not need more than 24 kHz.
+MURF_SAMPLE_RATE = 44100
+SUPPORTED_SAMPLE_RATES = (16000, 24000, 44100)
+SUPPORTED_CODECS = ("pcm16", "mulaw")
+
+# A stream whose header has not completed within this many bytes is malformed
+MAX_WAV_HEADER_BYTES = 64 * 1024
+
+# G.711 mu-law constants
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+
+
+class TruncatedWavHeader(ValueError):
+    """The payload ends before the WAV header does; more bytes are needed."""
+
+
+class WavFormat(NamedTuple):
+    sample_rate: int
+    channels: int
+    bits_per_sample: int
+
+
+def parse_wav_header(data: bytes) -> tuple[WavFormat, int]:
+    """
+    Walk the RIFF chunks of a WAV payload.
+    Returns the format and the byte offset where PCM samples start.
+    """
+    if data[:4] != b"RIFF" or (len(data) >= 12 and data[8:12] != b"WAVE"):
+        raise ValueError("Not a RIFF/WAVE payload")
+    if len(data) < 12:
+        raise TruncatedWavHeader("Truncated RIFF header")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", data, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16:
+                raise ValueError("Invalid fmt chunk")
+            if body + 16 > len(data):
+                raise TruncatedWavHeader("Truncated fmt chunk")
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            # 1 = PCM, 0xFFFE = WAVE_FORMAT_EXTENSIBLE (Murf may use either for PCM16)
+            if audio_format not in (1, 0xFFFE) or bits != 16:
+                raise ValueError(f"Unsupported WAV encoding: format={audio_format}, bits={bits}")
+            fmt = WavFormat(sample_rate, channels, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            return fmt, body
+        # Chunks are word aligned
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise TruncatedWavHeader("WAV header has no data chunk")
+
+
+def design_polyphase_filter(up: int, down: int, beta: float = 5.0) -> np.ndarray:
+    """
+    Kaiser-windowed sinc low-pass for rational resampling by up/down,
+    returned as a (up, taps_per_phase) polyphase bank.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps_per_phase = -(-(2 * half_len + 1) // up)
+    length = taps_per_phase * up
+
+    n = np.arange(2 * half_len + 1) - half_len
+    cutoff = 1.0 / max_rate
+    h = np.zeros(length)
+    h[:len(n)] = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), beta)
+    h *= up / h.sum()
+
+    # bank[p, t] = h[p + t * up]
+    return h.reshape(taps_per_phase, up).T.copy()
+
+
+class StreamingResampler:
+    """
+    Polyphase resampler that keeps filter history between chunks, so a
+    TTS stream can be resampled chunk-by-chunk without boundary clicks.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int):
+        g = gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.bank = design_polyphase_filter(self.up, self.down)
+        self.taps = self.bank.shape[1]
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Input index of _history[0], and index of the next output sample
+        self._base = -(self.taps - 1)
+        self._next_out = 0
+        self._tap_offsets = np.arange(self.taps)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.up == self.down:
+            return samples.astype(np.float32, copy=False)
+
+        buf = np.concatenate((self._history, samples.astype(np.float32, copy=False)))
+        end = self._base + len(buf)
+
+        # Output n sits at upsampled position n * down, i.e. input index (n * down) // up
+        last_out = (end * self.up - 1) // self.down
+        n = np.arange(self._next_out, last_out + 1, dtype=np.int64)
+        out = np.empty(0, dtype=np.float32)
+        if len(n):
+            pos = n * self.down
+            idx = pos // self.up - self._base
+            phase = pos % self.up
+            windows = buf[idx[:, None] - self._tap_offsets[None, :]]
+            out = np.einsum("ij,ij->i", windows, self.bank[phase]).astype(np.float32)
+            self._next_out = int(n[-1]) + 1
+
+        keep = self.taps - 1
+        self._history = buf[len(buf) - keep:].copy()
+        self._base = end - keep
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Push the filter tail out with silence."""
+        if self.up == self.down:
+            return np.empty(0, dtype=np.float32)
+        return self.process(np.zeros(self.taps // 2, dtype=np.float32))
+
+
+def _build_mulaw_exponent_lut() -> np.ndarray:
+    lut = np.zeros(256, dtype=np.uint8)
+    for i in range(1, 256):
+        lut[i] = i.bit_length() - 1
+    return lut
+
+
+_MULAW_EXP_LUT = _build_mulaw_exponent_lut()
+
+
+def mulaw_encode(pcm: np.ndarray) -> np.ndarray:
+    """Vectorised G.711 mu-law encoder for int16 samples."""
+    x = pcm.astype(np.int32)
+    sign = (x < 0).astype(np.int32) << 7
+    mag = np.minimum(np.abs(x), MULAW_CLIP) + MULAW_BIAS
+    exponent = _MULAW_EXP_LUT[mag >> 7].astype(np.int32)
+    mantissa = (mag >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+def mulaw_decode(encoded: np.ndarray) -> np.ndarray:
+    u = ~encoded.astype(np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + MULAW_BIAS) << exponent) - MULAW_BIAS
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def negotiate_audio_format(config_data: dict) -> Optional[tuple[int, str]]:
+    """
+    Read the client's requested TTS delivery format from the config message.
+    Returns None for clients that did not ask, which keep the raw Murf stream.
+    """
+    rate = config_data.get("audio_sample_rate")
+    codec = config_data.get("audio_codec")
+    if rate is None and codec is None:
+        return None
+
+    try:
+        rate = int(rate or MURF_SAMPLE_RATE)
+    except (TypeError, ValueError):
+        rate = MURF_SAMPLE_RATE
+    if rate not in SUPPORTED_SAMPLE_RATES:
+        logger.warning("Unsupported audio_sample_rate %s, using %s", rate, MURF_SAMPLE_RATE)
+        rate = MURF_SAMPLE_RATE
+
+    codec = codec or "pcm16"
+    if codec not in SUPPORTED_CODECS:
+        logger.warning("Unsupported audio_codec %s, using pcm16", codec)
+        codec = "pcm16"
+    return rate, codec
+
+
+class TTSAudioEncoder:
+    """
+    Converts one Murf WAV stream into the client's negotiated rate and codec.
+    A RIFF header is only looked for at the start of a stream (and again
+    after flush()), and may be split across chunks; later chunks are raw PCM
+    even if their first bytes happen to read "RIFF".
+    """
+
+    def __init__(self, sample_rate: int, codec: str = "pcm16"):
+        if codec not in SUPPORTED_CODECS:
+            raise ValueError(f"Unsupported codec: {codec}")
+        self.sample_rate = sample_rate
+        self.codec = codec
+        self.source_format = WavFormat(MURF_SAMPLE_RATE, 1, 16)
+        self._resampler: Optional[StreamingResampler] = None
+        self._pending = b""
+        self._expect_header = True
+
+    def _get_resampler(self) -> StreamingResampler:
+        if self._resampler is None or self._resampler.in_rate != self.source_format.sample_rate:
+            self._resampler = StreamingResampler(self.source_format.sample_rate, self.sample_rate)
+        return self._resampler
+
+    def _encode_samples(self, samples: np.ndarray) -> bytes:
+        pcm = np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+        if self.codec == "mulaw":
+            return mulaw_encode(pcm).tobytes()
+        return pcm.astype("<i2").tobytes()
+
+    def encode(self, chunk: bytes) -> bytes:
+        data = self._pending + chunk
+        if self._expect_header:
+            if len(data) < 4:
+                self._pending = data
+                return b""
+            if data[:4] == b"RIFF":
+                try:
+                    self.source_format, offset = parse_wav_header(data)
+                except TruncatedWavHeader:
+                    if len(data) > MAX_WAV_HEADER_BYTES:
+                        raise
+                    self._pending = data
+                    return b""
+                data = data[offset:]
+            self._expect_header = False
+
+        frame_size = 2 * self.source_format.channels
+        usable = len(data) - len(data) % frame_size
+        self._pending = data[usable:]
+        if not usable:
+            return b""
+
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32)
+        if self.source_format.channels > 1:
+            samples = samples.reshape(-1, self.source_format.channels).mean(axis=1)
+        return self._encode_samples(self._get_resampler().process(samples))
+
+    def encode_b64(self, chunk_b64: str) -> str:
+        return base64.b64encode(self.encode(base64.b64decode(chunk_b64))).decode("ascii")
+
+    def flush(self) -> bytes:
+        """End the current stream: emit the filter tail and expect a new header."""
+        self._pending = b""
+        self._expect_header = True
+        if self._resampler is None:
+            return b""
+        tail = self._encode_samples(self._resampler.flush())
+        # The next stream starts with fresh filter history
+        self._resampler = None
+        return tail
+
+    def flush_b64(self) -> str:
+        return base64.b64encode(self.flush()).decode("ascii")
@@ -0,0 +1,222 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from enum import IntEnum
+from typing import Iterator, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, u16 version, then records of
+#   u8 kind | i64 monotonic ns since session start | u32 payload length | payload
+MAGIC = b"VASR"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sH")
+RECORD_HEADER = struct.Struct("<BqI")
+LOG_SUFFIX = ".vasr"
+
+# Fields that must never reach disk: API keys, and the resume token, which
+# is enough to restore a user's stored chat history
+REDACTED_SUFFIX = "_key"
+REDACTED_FIELDS = ("resume_token",)
+
+
+class RecordKind(IntEnum):
+    INBOUND_AUDIO = 1     # raw PCM16 frame from the browser
+    INBOUND_MESSAGE = 2   # JSON text from the browser (config, playback_stats)
+    TURN_EVENT = 3        # JSON: AssemblyAI Turn event
+    LLM_CHUNK = 4         # UTF-8 text chunk from Gemini
+    NEWS_RESULT = 5       # JSON: {"text", "links"} from the news skill
+    MURF_AUDIO = 6        # decoded audio bytes from Murf
+    MURF_FINAL = 7        # empty: Murf reported the end of a stream
+    OUTBOUND = 8          # JSON text sent to the browser
+
+
+class Record(NamedTuple):
+    kind: RecordKind
+    timestamp_ns: int
+    payload: memoryview
+
+    def json(self):
+        return json.loads(bytes(self.payload))
+
+    def text(self) -> str:
+        return bytes(self.payload).decode("utf-8")
+
+
+def redact_config(message: dict) -> dict:
+    return {
+        k: ("***" if (k.endswith(REDACTED_SUFFIX) or k in REDACTED_FIELDS) and v else v)
+        for k, v in message.items()
+    }
+
+
+def redact_outbound(message: dict) -> dict:
+    if message.get("type") == "session" and message.get("token"):
+        return {**message, "token": "***"}
+    return message
+
+
+class SessionRecorder:
+    """
+    Append-only binary log of one /ws session. Safe to call from the event
+    loop and from the AssemblyAI callback thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._start_ns = time.monotonic_ns()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    @classmethod
+    def for_new_session(cls, directory: str) -> "SessionRecorder":
+        os.makedirs(directory, exist_ok=True)
+        name = f"session-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.urandom(4).hex()}{LOG_SUFFIX}"
+        return cls(os.path.join(directory, name))
+
+    def record(self, kind: RecordKind, payload: bytes = b""):
+        timestamp = time.monotonic_ns() - self._start_ns
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(RECORD_HEADER.pack(kind, timestamp, len(payload)))
+            self._file.write(payload)
+
+    def record_json(self, kind: RecordKind, data):
+        self.record(kind, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+    def record_text(self, kind: RecordKind, text: str):
+        self.record(kind, text.encode("utf-8"))
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                logger.info("Session log written to %s", self.path)
+
+
+class SessionLog:
+    """Memory-mapped reader for a session log."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < FILE_HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a session log")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path}: unsupported session log (magic={magic!r}, version={version})")
+
+    def __enter__(self) -> "SessionLog":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    def records(self, kinds: Optional[set] = None) -> Iterator[Record]:
+        """
+        Iterate records in file order. Payloads are views into the map, so
+        filtering by kind only touches record headers. A truncated trailing
+        record (e.g. a crash mid-write) ends the iteration.
+        """
+        view = memoryview(self._mm)
+        offset = FILE_HEADER.size
+        end = len(self._mm)
+        try:
+            while offset + RECORD_HEADER.size <= end:
+                kind, timestamp, length = RECORD_HEADER.unpack_from(self._mm, offset)
+                start = offset + RECORD_HEADER.size
+                offset = start + length
+                if offset > end:
+                    logger.warning("%s: truncated record at byte %d", self.path, start)
+                    break
+                if kinds is None or kind in kinds:
+                    yield Record(RecordKind(kind), timestamp, view[start:offset])
+        finally:
+            view.release()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+STAGES = ("llm_first_text", "llm_final", "tts_first_audio", "tts_final")
+
+
+def stage_latencies(events: list[tuple[int, str, dict]]) -> list[dict]:
+    """
+    Per-turn stage latencies (ms) from a time-ordered list of
+    (timestamp_ns, source, message), where source is "turn" for a final
+    AssemblyAI turn and "out" for a message sent to the browser.
+    """
+    turns = []
+    current = None
+    for timestamp, source, message in events:
+        if source == "turn":
+            current = {"transcript": message.get("transcript", ""), "_start": timestamp}
+            turns.append(current)
+            continue
+        if current is None:
+            continue
+
+        elapsed = round((timestamp - current["_start"]) / 1e6, 1)
+        msg_type = message.get("type")
+        if msg_type == "llm_text":
+            current.setdefault("llm_first_text", elapsed)
+        elif msg_type == "llm_text_final":
+            current.setdefault("llm_first_text", elapsed)
+            current.setdefault("llm_final", elapsed)
+        elif msg_type == "ai_audio" and not message.get("final"):
+            current.setdefault("tts_first_audio", elapsed)
+        elif msg_type == "ai_audio" and message.get("final"):
+            current.setdefault("tts_final", elapsed)
+
+    for turn in turns:
+        del turn["_start"]
+    return turns
+
+
+def summarize_latencies(turns: list[dict]) -> dict:
+    summary = {}
+    for stage in STAGES:
+        values = [t[stage] for t in turns if stage in t]
+        if values:
+            summary[stage] = {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p90": _percentile(values, 90),
+                "max": max(values),
+            }
+    return summary
+
+
+def recorded_latency_report(log: SessionLog) -> dict:
+    """Stage latencies as they happened in the recorded session."""
+    events = []
+    for record in log.records({RecordKind.TURN_EVENT, RecordKind.OUTBOUND}):
+        message = record.json()
+        if record.kind == RecordKind.TURN_EVENT:
+            if message.get("end_of_turn") and message.get("transcript", "").strip():
+                events.append((record.timestamp_ns, "turn", message))
+        else:
+            events.append((record.timestamp_ns, "out", message))
+    turns = stage_latencies(events)
+    return {"turns": turns, "summary": summarize_latencies(turns)}
@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import json
+import logging
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+from app.routers.transcriber import AssemblyAIStreamingTranscriber
+from app.services.audio_service import negotiate_audio_format
+from app.services.session_recorder import (
+    RecordKind, SessionLog, recorded_latency_report, stage_latencies, summarize_latencies
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RecordedTurn:
+    def __init__(self, timestamp_ns: int, transcript: str):
+        self.timestamp_ns = timestamp_ns
+        self.transcript = transcript
+        self.llm_chunks: list[tuple[int, str]] = []
+        self.news: Optional[tuple[int, dict]] = None
+        # (timestamp_ns, audio bytes), None audio marks Murf's final message
+        self.murf: list[tuple[int, Optional[bytes]]] = []
+
+    @property
+    def text_done_ns(self) -> int:
+        """When the LLM side of the turn finished, i.e. when text went to Murf."""
+        times = [t for t, _ in self.llm_chunks]
+        if self.news:
+            times.append(self.news[0])
+        return max(times, default=self.timestamp_ns)
+
+
+class RecordedSession:
+    """Recorded session split into a config, inbound audio and per-turn upstream events."""
+
+    def __init__(self, log: SessionLog):
+        self.config: dict = {}
+        self.audio: list[tuple[int, bytes]] = []
+        self.turns: list[RecordedTurn] = []
+
+        turn = None
+        for record in log.records():
+            if record.kind == RecordKind.INBOUND_MESSAGE:
+                message = record.json()
+                if message.get("type") == "config" and not self.config:
+                    self.config = message
+            elif record.kind == RecordKind.INBOUND_AUDIO:
+                self.audio.append((record.timestamp_ns, bytes(record.payload)))
+            elif record.kind == RecordKind.TURN_EVENT:
+                event = record.json()
+                if event.get("end_of_turn") and event.get("transcript", "").strip():
+                    turn = RecordedTurn(record.timestamp_ns, event["transcript"])
+                    self.turns.append(turn)
+            elif turn is None:
+                continue
+            elif record.kind == RecordKind.LLM_CHUNK:
+                turn.llm_chunks.append((record.timestamp_ns, record.text()))
+            elif record.kind == RecordKind.NEWS_RESULT:
+                turn.news = (record.timestamp_ns, record.json())
+            elif record.kind == RecordKind.MURF_AUDIO:
+                turn.murf.append((record.timestamp_ns, bytes(record.payload)))
+            elif record.kind == RecordKind.MURF_FINAL:
+                turn.murf.append((record.timestamp_ns, None))
+
+
+class ReplayWebSocket:
+    """Stands in for the browser socket and timestamps everything sent to it."""
+
+    def __init__(self):
+        self.events: list[tuple[int, str, dict]] = []
+
+    def mark_turn(self, transcript: str):
+        self.events.append((time.monotonic_ns(), "turn", {"transcript": transcript}))
+
+    async def send_json(self, message: dict):
+        self.events.append((time.monotonic_ns(), "out", message))
+
+
+class FakeStreamingClient:
+    """AssemblyAI client stand-in; turns are injected from the log instead."""
+
+    def __init__(self):
+        self.bytes_streamed = 0
+
+    def stream(self, chunk: bytes):
+        self.bytes_streamed += len(chunk)
+
+    def set_params(self, params):
+        pass
+
+    def disconnect(self, terminate: bool = False):
+        pass
+
+
+class ReplayLLMService:
+    def __init__(self, replay: "ReplayTranscriber"):
+        self.replay = replay
+
+    def stream(self, history: list):
+        # Sleeps happen while the pipeline iterates, as the real Gemini stream blocks there too
+        turn = self.replay.current_turn
+        previous = turn.timestamp_ns
+        for timestamp, chunk in turn.llm_chunks:
+            if self.replay.realtime:
+                time.sleep((timestamp - previous) / 1e9)
+            previous = timestamp
+            yield chunk
+
+
+class FakeMurfSocket:
+    def __init__(self, turn: RecordedTurn, realtime: bool):
+        self.turn = turn
+        self.realtime = realtime
+        self.messages = list(turn.murf)
+        self.previous_ns = turn.text_done_ns
+        self.text_done = asyncio.Event()
+        self.close_code = None
+
+    async def send(self, message: str):
+        data = json.loads(message)
+        if data.get("end"):
+            self.text_done.set()
+
+    async def recv(self) -> str:
+        await self.text_done.wait()
+        if not self.messages:
+            return json.dumps({"final": True})
+
+        timestamp, audio = self.messages.pop(0)
+        if self.realtime:
+            await asyncio.sleep(max(0, timestamp - self.previous_ns) / 1e9)
+        self.previous_ns = timestamp
+        if audio is None:
+            return json.dumps({"final": True})
+        return json.dumps({"audio": base64.b64encode(audio).decode("ascii")})
+
+    async def close(self):
+        self.close_code = 1000
+
+
+class ReplayTranscriber(AssemblyAIStreamingTranscriber):
+    """The real pipeline, with every upstream provider served from the log."""
+
+    def __init__(self, websocket: ReplayWebSocket, loop, session: RecordedSession, realtime: bool):
+        super().__init__(websocket, loop)
+        self.session = session
+        self.realtime = realtime
+        self.current_turn: Optional[RecordedTurn] = None
+
+        self.client = FakeStreamingClient()
+        self.llm_service = ReplayLLMService(self)
+        self.murf_api_key = "replay" if session.config.get("murf_key") else None
+        self.audio_format = negotiate_audio_format(session.config)
+
+    async def connect_murf(self, url: str):
+        return FakeMurfSocket(self.current_turn, self.realtime)
+
+    async def fetch_news(self):
+        timestamp, result = self.current_turn.news or (self.current_turn.timestamp_ns, {"text": "", "links": []})
+        if self.realtime:
+            await asyncio.sleep(max(0, timestamp - self.current_turn.timestamp_ns) / 1e9)
+        return result["text"], result["links"]
+
+
+async def replay_session(path: str, realtime: bool = True) -> dict:
+    """
+    Drive the pipeline from a session log and return a stage-latency report
+    for the replay next to the one recorded in production.
+    """
+    with SessionLog(path) as log:
+        session = RecordedSession(log)
+        recorded = recorded_latency_report(log)
+
+    loop = asyncio.get_running_loop()
+    websocket = ReplayWebSocket()
+    transcriber = ReplayTranscriber(websocket, loop, session, realtime)
+
+    timeline = [(t, "audio", chunk) for t, chunk in session.audio]
+    timeline += [(turn.timestamp_ns, "turn", turn) for turn in session.turns]
+    timeline.sort(key=lambda item: item[0])
+
+    start = time.monotonic_ns()
+    for timestamp, kind, item in timeline:
+        if realtime:
+            await asyncio.sleep(max(0, start + timestamp - time.monotonic_ns()) / 1e9)
+
+        if kind == "audio":
+            transcriber.stream_audio(item)
+            continue
+
+        transcriber.current_turn = item
+        websocket.mark_turn(item.transcript)
+        event = SimpleNamespace(transcript=item.transcript, end_of_turn=True, turn_is_formatted=True)
+        # AssemblyAI delivers turns on its own thread
+        await asyncio.to_thread(transcriber.on_turn_event, transcriber.client, event)
+        await asyncio.wrap_future(transcriber.response_future)
+
+    turns = stage_latencies(websocket.events)
+    return {
+        "log": path,
+        "mode": "realtime" if realtime else "fast",
+        "wall_ms": round((time.monotonic_ns() - start) / 1e6, 1),
+        "audio_bytes": transcriber.client.bytes_streamed,
+        "replay": {"turns": turns, "summary": summarize_latencies(turns)},
+        "recorded": recorded,
+    }
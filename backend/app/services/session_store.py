@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_token TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_token, id);
+"""
+
+# Writer thread waits this long for more rows before committing a batch
+BATCH_INTERVAL = 0.05
+MAX_BATCH = 256
+# Messages restored on resume; the LLM only sees the last few anyway
+RESTORE_LIMIT = 50
+
+
+def new_session_token() -> str:
+    return secrets.token_urlsafe(24)
+
+
+class ConversationStore:
+    """
+    Append-only chat history in SQLite (WAL mode). append() only enqueues;
+    a single writer thread commits rows in batches off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._ready = threading.Event()
+        self._writer = threading.Thread(target=self._run_writer, name="conversation-store", daemon=True)
+        self._writer.start()
+        self._ready.wait()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run_writer(self):
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._ready.set()
+
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_INTERVAL
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = [row for row in batch if row is not None]
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO messages (session_token, role, text, created_at) VALUES (?, ?, ?, ?)",
+                            batch,
+                        )
+                except sqlite3.Error as e:
+                    logger.error("Failed to persist %d messages: %s", len(batch), e)
+        conn.close()
+
+    def append(self, session_token: str, role: str, text: str):
+        self._queue.put((session_token, role, text, time.time()))
+
+    def load_history(self, session_token: str, limit: int = RESTORE_LIMIT) -> list[dict]:
+        """Most recent messages for a session, oldest first, in chat_history format."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT role, text FROM messages WHERE session_token = ? ORDER BY id DESC LIMIT ?",
+                (session_token, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"role": role, "parts": [{"text": text}]} for role, text in reversed(rows)]
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+
+class SessionRegistry:
+    """
+    Tracks transcribers by session token: live ones attached to a socket,
+    and parked ones kept warm for a grace period after their socket
+    dropped, so a reconnect with the same token can take over their
+    provider clients.
+    """
+
+    def __init__(self, grace_seconds: float):
+        self.grace_seconds = grace_seconds
+        self._live: dict[str, object] = {}
+        self._parked: dict[str, tuple[object, asyncio.TimerHandle]] = {}
+
+    def register(self, token: str, transcriber):
+        self._live[token] = transcriber
+
+    def park(self, token: str, transcriber, loop: asyncio.AbstractEventLoop):
+        if self._live.get(token) is transcriber:
+            del self._live[token]
+        self.discard(token)
+        handle = loop.call_later(self.grace_seconds, self._expire, token)
+        self._parked[token] = (transcriber, handle)
+        logger.info("Session parked for %ss", self.grace_seconds)
+
+    def peek(self, token: Optional[str]):
+        if not token:
+            return None
+        entry = self._parked.get(token)
+        return entry[0] if entry else self._live.get(token)
+
+    def claim(self, token: Optional[str]):
+        """Take a session out of the registry, whether parked or still live."""
+        if not token:
+            return None
+        entry = self._parked.pop(token, None)
+        if entry is None:
+            return self._live.pop(token, None)
+        transcriber, handle = entry
+        handle.cancel()
+        return transcriber
+
+    def discard(self, token: str):
+        transcriber = self.claim(token)
+        if transcriber:
+            transcriber.close()
+
+    def _expire(self, token: str):
+        entry = self._parked.pop(token, None)
+        if entry:
+            logger.info("Session grace period over, closing provider clients")
+            entry[0].close()
+
+    def close_all(self):
+        for token in list(self._parked):
+            self.discard(token)
@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+from os import PathLike
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are still produced
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+URL_PREFIX = "/static/"
+
+# Files whose contents reference other assets and get rewritten
+TEXT_EXTENSIONS = (".css", ".js")
+HTML_EXTENSIONS = (".html",)
+
+# A compressed variant is only kept when it is meaningfully smaller
+MIN_COMPRESSION_SAVING = 0.05
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def _rewrite_references(text: str, url_map: dict[str, str]) -> str:
+    if not url_map:
+        return text
+    # Longest first so "/static/a.js" never shadows "/static/a.js.map"-style names
+    pattern = re.compile("|".join(re.escape(url) for url in sorted(url_map, key=len, reverse=True)))
+    return pattern.sub(lambda m: url_map[m.group(0)], text)
+
+
+def _write_compressed_variants(path: str, data: bytes) -> list[str]:
+    encodings = []
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+
+    for encoding, payload in variants.items():
+        if len(payload) <= len(data) * (1 - MIN_COMPRESSION_SAVING):
+            with open(path + ENCODING_SUFFIXES[encoding], "wb") as f:
+                f.write(payload)
+            encodings.append(encoding)
+    return encodings
+
+
+def build_static_assets(src_dir: str, out_dir: str) -> dict:
+    """
+    Copy src_dir into out_dir with content-hashed filenames, rewrite
+    /static/ references in HTML/CSS/JS, and write gzip/brotli variants.
+    Returns the manifest that is also written to out_dir/manifest.json.
+    """
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    files = []
+    for root, dirs, names in os.walk(src_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if not name.startswith("."):
+                files.append(os.path.relpath(os.path.join(root, name), src_dir).replace(os.sep, "/"))
+
+    def order(rel_path: str) -> int:
+        # Binary assets first, then CSS/JS that point at them, then HTML that points at everything
+        ext = os.path.splitext(rel_path)[1].lower()
+        return 2 if ext in HTML_EXTENSIONS else 1 if ext in TEXT_EXTENSIONS else 0
+
+    url_map: dict[str, str] = {}
+    manifest: dict[str, dict] = {}
+    for rel_path in sorted(files, key=lambda p: (order(p), p)):
+        with open(os.path.join(src_dir, rel_path), "rb") as f:
+            data = f.read()
+
+        kind = order(rel_path)
+        if kind:
+            data = _rewrite_references(data.decode("utf-8"), url_map).encode("utf-8")
+
+        digest = _content_hash(data)
+        # HTML entry points keep their names so they can be revalidated
+        out_rel = rel_path if kind == 2 else _hashed_name(rel_path, digest)
+        out_path = os.path.join(out_dir, out_rel)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, "wb") as f:
+            f.write(data)
+
+        url_map[URL_PREFIX + rel_path] = URL_PREFIX + out_rel
+        manifest[out_rel] = {
+            "source": rel_path,
+            "etag": digest,
+            "immutable": kind != 2,
+            "encodings": _write_compressed_variants(out_path, data),
+        }
+        logger.info("Built %s -> %s %s", rel_path, out_rel, manifest[out_rel]["encodings"])
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _accepted_encodings(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles for a directory produced by build_static_assets: serves
+    .br/.gz variants by Accept-Encoding, content-hash ETags, and
+    immutable caching for hashed filenames.
+    """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            self.manifest: dict[str, dict] = json.load(f)
+
+    def _choose_encoding(self, entry: dict, request_headers: Headers) -> Optional[str]:
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding in ("br", "gzip"):
+            if encoding in entry["encodings"] and encoding in accepted:
+                return encoding
+        return None
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        rel_path = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        entry = self.manifest.get(rel_path)
+        if entry is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        encoding = self._choose_encoding(entry, request_headers)
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE if entry["immutable"] else REVALIDATE_CACHE,
+            "ETag": f'"{entry["etag"]}-{encoding}"' if encoding else f'"{entry["etag"]}"',
+        }
+        if entry["encodings"]:
+            headers["Vary"] = "Accept-Encoding"
+
+        path = str(full_path)
+        if encoding:
+            path += ENCODING_SUFFIXES[encoding]
+            headers["Content-Encoding"] = encoding
+            stat_result = os.stat(path)
+
+        # FileResponse hands the path to the server for sendfile only when it
+        # advertises the pathsend extension (uvicorn does not); otherwise it
+        # streams the file in chunks
+        response = FileResponse(
+            path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers=headers,
+            media_type=mimetypes.guess_type(rel_path)[0] or "application/octet-stream",
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
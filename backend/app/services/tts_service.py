@@ -5,6 +5,7 @@ import json
 import base64
 from typing import Optional
 from ..core.config import MURF_API_KEY
+from .audio_service import parse_wav_header
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +43,6 @@ class TTSService:
                 await ws.send(json.dumps(text_msg))
                 logger.info(f"Sent text: {text[:50]}...")
 
-                first_chunk = True
                 while True:
                     response = await ws.recv()
                     data = json.loads(response)
@@ -54,9 +54,9 @@ class TTSService:
 
                         # If you want raw bytes instead:
                         audio_bytes = base64.b64decode(audio_b64)
-                        if first_chunk and len(audio_bytes) > 44:  # skip WAV header
-                            audio_bytes = audio_bytes[44:]
-                            first_chunk = False
+                        if audio_bytes[:4] == b"RIFF":  # strip WAV header
+                            _, data_offset = parse_wav_header(audio_bytes)
+                            audio_bytes = audio_bytes[data_offset:]
 
                     if data.get("final"):
                         logger.info("✅ TTS streaming complete")
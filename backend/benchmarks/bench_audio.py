@@ -0,0 +1,58 @@
+"""
+Throughput of the TTS audio stage, reported as realtime factor per core.
+
+    python -m benchmarks.bench_audio [--seconds 30] [--chunk-ms 100]
+
+A realtime factor of N means one core converts N seconds of Murf audio per
+second of wall time. The stage is single threaded, so this is per core.
+"""
+import argparse
+import io
+import time
+import wave
+
+import numpy as np
+
+from app.services.audio_service import MURF_SAMPLE_RATE, TTSAudioEncoder
+
+
+def make_murf_like_wav(seconds: float) -> bytes:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * MURF_SAMPLE_RATE)) / MURF_SAMPLE_RATE
+    # Voiced-ish signal: a few harmonics plus noise
+    signal = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 1800, 3200)))
+    signal = signal * 6000 + rng.normal(0, 300, len(t))
+    pcm = np.clip(signal, -32768, 32767).astype("<i2")
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(MURF_SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def run(seconds: float, chunk_ms: int) -> None:
+    wav = make_murf_like_wav(seconds)
+    chunk_bytes = int(MURF_SAMPLE_RATE * chunk_ms / 1000) * 2
+    chunks = [wav[i:i + chunk_bytes] for i in range(0, len(wav), chunk_bytes)]
+    source_bytes = len(wav)
+
+    print(f"{seconds:.0f}s of 44.1 kHz PCM16, {chunk_ms} ms chunks ({len(chunks)} chunks)")
+    print(f"{'rate':>6} {'codec':>6} {'RTF/core':>10} {'bytes':>10} {'ratio':>6}")
+    for rate in (16000, 24000, 44100):
+        for codec in ("pcm16", "mulaw"):
+            encoder = TTSAudioEncoder(rate, codec)
+            start = time.process_time()
+            out = sum(len(encoder.encode(c)) for c in chunks) + len(encoder.flush())
+            elapsed = max(time.process_time() - start, 1e-9)
+            print(f"{rate:>6} {codec:>6} {seconds / elapsed:>10.1f} {out:>10} {source_bytes / out:>5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    args = parser.parse_args()
+    run(args.seconds, args.chunk_ms)
@@ -0,0 +1,18 @@
+import argparse
+import logging
+import os
+
+from app.core.logging_config import setup_logging
+from app.services.static_assets import build_static_assets
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build hashed, precompressed static assets.")
+    parser.add_argument("--src", default=os.path.join(BACKEND_DIR, "..", "frontend"))
+    parser.add_argument("--out", default=os.path.join(BACKEND_DIR, "static_dist"))
+    args = parser.parse_args()
+
+    setup_logging()
+    manifest = build_static_assets(os.path.abspath(args.src), os.path.abspath(args.out))
+    logging.getLogger(__name__).info("Wrote %d assets to %s", len(manifest), args.out)
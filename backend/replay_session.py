@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+import json
+
+from app.services.session_recorder import STAGES
+from app.services.session_replay import replay_session
+
+
+def print_summary(title: str, summary: dict):
+    print(title)
+    print(f"  {'stage':<16} {'n':>4} {'p50 ms':>9} {'p90 ms':>9} {'max ms':>9}")
+    for stage in STAGES:
+        if stage in summary:
+            s = summary[stage]
+            print(f"  {stage:<16} {s['count']:>4} {s['p50']:>9.1f} {s['p90']:>9.1f} {s['max']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session against local fakes.")
+    parser.add_argument("log", help="session log written with SESSION_RECORD_DIR set")
+    parser.add_argument("--fast", action="store_true", help="replay as fast as possible instead of in real time")
+    parser.add_argument("--output", help="write the JSON report here, for diffing across commits")
+    args = parser.parse_args()
+
+    report = asyncio.run(replay_session(args.log, realtime=not args.fast))
+    print_summary("Recorded:", report["recorded"]["summary"])
+    print_summary(f"Replay ({report['mode']}, {report['wall_ms']:.0f} ms wall):", report["replay"]["summary"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
@@ -0,0 +1,146 @@
+// === AudioWorklet processors ===
+// Loaded by script.js through audioWorklet.addModule(); runs on the audio thread.
+
+// Mic capture: converts render quanta to PCM16 and posts fixed-size frames.
+class PCMCaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const opts = options.processorOptions || {};
+        const frameMs = Math.min(50, Math.max(20, opts.frameMs || 25));
+        this.frameSize = Math.round(sampleRate * frameMs / 1000);
+        this.frame = new Int16Array(this.frameSize);
+        this.offset = 0;
+    }
+
+    process(inputs) {
+        const input = inputs[0] && inputs[0][0];
+        if (!input) return true;
+
+        for (let i = 0; i < input.length; i++) {
+            const s = Math.max(-1, Math.min(1, input[i]));
+            this.frame[this.offset++] = s < 0 ? s * 0x8000 : s * 0x7fff;
+            if (this.offset === this.frameSize) {
+                this.port.postMessage(this.frame.buffer, [this.frame.buffer]);
+                this.frame = new Int16Array(this.frameSize);
+                this.offset = 0;
+            }
+        }
+        return true;
+    }
+}
+
+// TTS playback: sample-accurate output from an adaptive jitter buffer.
+// Messages in:  {type: "push", samples}, {type: "end"}, {type: "clear"}
+// Messages out: {type: "started"}, {type: "underrun"}, {type: "drained"}
+class JitterPlaybackProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const opts = options.processorOptions || {};
+        const ms = (value) => Math.round(sampleRate * value / 1000);
+        this.minTarget = ms(opts.minBufferMs || 40);
+        this.maxTarget = ms(opts.maxBufferMs || 400);
+        this.growStep = ms(opts.growMs || 40);
+        this.target = ms(opts.initialBufferMs || 80);
+        // Shrink the target again after this much underrun-free playback
+        this.decayAfter = ms(opts.decayAfterMs || 3000);
+
+        this.queue = [];
+        this.head = 0;
+        this.buffered = 0;
+        this.playing = false;
+        this.ended = false;
+        // Ran dry mid-stream; only an underrun if more audio follows rather than "end"
+        this.starved = false;
+        this.underruns = 0;
+        this.cleanSamples = 0;
+
+        this.port.onmessage = (e) => this.onMessage(e.data);
+    }
+
+    onMessage(msg) {
+        if (msg.type === "push") {
+            this.queue.push(msg.samples);
+            this.buffered += msg.samples.length;
+            this.ended = false;
+            if (this.starved) {
+                this.starved = false;
+                this.underruns++;
+                this.target = Math.min(this.maxTarget, this.target + this.growStep);
+                this.report("underrun");
+            }
+        } else if (msg.type === "end") {
+            if (!this.playing && this.buffered === 0) {
+                // Already played out, e.g. the final message arrived late
+                this.starved = false;
+                this.report("drained");
+            } else {
+                this.ended = true;
+            }
+        } else if (msg.type === "clear") {
+            this.queue = [];
+            this.head = 0;
+            this.buffered = 0;
+            this.playing = false;
+            this.ended = false;
+            this.starved = false;
+        }
+    }
+
+    report(type) {
+        this.port.postMessage({
+            type,
+            underruns: this.underruns,
+            targetMs: Math.round(this.target * 1000 / sampleRate),
+            bufferedMs: Math.round(this.buffered * 1000 / sampleRate),
+        });
+    }
+
+    process(inputs, outputs) {
+        const out = outputs[0][0];
+
+        if (!this.playing) {
+            // Prebuffer up to the target, unless the stream has already ended
+            if (this.buffered >= this.target || (this.ended && this.buffered > 0)) {
+                this.playing = true;
+                this.report("started");
+            } else {
+                return true;
+            }
+        }
+
+        let written = 0;
+        while (written < out.length && this.queue.length) {
+            const chunk = this.queue[0];
+            const n = Math.min(out.length - written, chunk.length - this.head);
+            out.set(chunk.subarray(this.head, this.head + n), written);
+            written += n;
+            this.head += n;
+            this.buffered -= n;
+            if (this.head === chunk.length) {
+                this.queue.shift();
+                this.head = 0;
+            }
+        }
+
+        if (written < out.length) {
+            this.playing = false;
+            this.cleanSamples = 0;
+            if (this.ended) {
+                this.ended = false;
+                this.report("drained");
+            } else {
+                this.starved = true;
+            }
+        } else {
+            this.cleanSamples += written;
+            if (this.cleanSamples >= this.decayAfter) {
+                this.target = Math.max(this.minTarget, this.target - this.growStep / 2);
+                this.cleanSamples = 0;
+            }
+        }
+        return true;
+    }
+}
+
+registerProcessor("pcm-capture-processor", PCMCaptureProcessor);
+registerProcessor("jitter-playback-processor", JitterPlaybackProcessor);
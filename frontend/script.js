@@ -45,7 +45,23 @@ document.addEventListener("DOMContentLoaded", () => {
     let waveRAF = null;
     let waveActive = false;
     const SAMPLE_RATE = 44100;
-    const WS_URL = "ws://127.0.0.1:8000/ws";
+    // TTS delivery format requested from the server (resampled + mu-law encoded)
+    const TTS_SAMPLE_RATE = 24000;
+    const TTS_CODEC = "mulaw";
+    // Mic frame size sent to the server (20-50 ms); two 25 ms frames fill
+    // exactly one 50 ms AssemblyAI chunk on the server
+    const CAPTURE_FRAME_MS = 25;
+    const WORKLET_URL = "/static/audio-worklets.js";
+    const WS_URL = (window.location.protocol === "https:" ? "wss://" : "ws://") + window.location.host + "/ws";
+    // Reconnect quickly after an unexpected drop, backing off exponentially;
+    // the session token lets the server resume
+    const RECONNECT_DELAY_MS = 500;
+    const RECONNECT_MAX_DELAY_MS = 8000;
+    const RECONNECT_MAX_ATTEMPTS = 6;
+    let reconnectAttempts = 0;
+    const SESSION_TOKEN_KEY = "sessionToken";
+    // Sent by the server when another tab resumed this session
+    const SESSION_TAKEN_OVER_CODE = 4001;
 
     const STATE_GIFS = {
         idle: "/static/images/robot.gif",
@@ -55,13 +71,34 @@ document.addEventListener("DOMContentLoaded", () => {
     };
 
     // Audio playback state
-    let audioQueue = [];
+    let playbackCtx, playbackNode;
     let isPlaying = false;
-    let audioContext;
     let isSpeaking = false;
 
 
+    // G.711 mu-law byte -> float sample lookup table
+    const MULAW_TABLE = (() => {
+        const table = new Float32Array(256);
+        for (let i = 0; i < 256; i++) {
+            const u = ~i & 0xff;
+            const exponent = (u >> 4) & 0x07;
+            const mantissa = u & 0x0f;
+            const magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84;
+            table[i] = ((u & 0x80) ? -magnitude : magnitude) / 32768;
+        }
+        return table;
+    })();
+
     // === Core Functions ===
+    function base64ToMulawFloat32(base64) {
+        const binary = atob(base64);
+        const float32Array = new Float32Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            float32Array[i] = MULAW_TABLE[binary.charCodeAt(i)];
+        }
+        return float32Array;
+    }
+
     function base64ToPCMFloat32(base64) {
         let binary = atob(base64);
         const header = binary.slice(0, 4);
@@ -86,79 +123,91 @@ document.addEventListener("DOMContentLoaded", () => {
         return float32Array;
     }
 
-    function playNextChunk() {
-        if (audioQueue.length > 0 && !isPlaying) {
+    function resampleLinear(samples, fromRate, toRate) {
+        const ratio = fromRate / toRate;
+        const out = new Float32Array(Math.floor(samples.length / ratio));
+        for (let i = 0; i < out.length; i++) {
+            const pos = i * ratio;
+            const idx = Math.floor(pos);
+            const next = Math.min(idx + 1, samples.length - 1);
+            out[i] = samples[idx] + (samples[next] - samples[idx]) * (pos - idx);
+        }
+        return out;
+    }
+
+    async function ensurePlayback() {
+        if (playbackNode) return;
+        playbackCtx = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: TTS_SAMPLE_RATE });
+        await playbackCtx.audioWorklet.addModule(WORKLET_URL);
+        playbackNode = new AudioWorkletNode(playbackCtx, "jitter-playback-processor", {
+            numberOfInputs: 0,
+            outputChannelCount: [1],
+        });
+        playbackNode.port.onmessage = (e) => handlePlaybackEvent(e.data);
+        playbackNode.connect(playbackCtx.destination);
+        await playbackCtx.resume();
+        console.log("DEBUG: Playback worklet ready at", playbackCtx.sampleRate, "Hz.");
+    }
+
+    function handlePlaybackEvent(event) {
+        if (event.type === "started") {
             isPlaying = true;
-            console.log("DEBUG: Playing next chunk from queue. Chunks remaining:", audioQueue.length);
-            const float32Array = audioQueue.shift();
-            
-            const buffer = audioContext.createBuffer(1, float32Array.length, SAMPLE_RATE);
-            buffer.copyToChannel(float32Array, 0);
-            
-            const source = audioContext.createBufferSource();
-            source.buffer = buffer;
-            source.connect(audioContext.destination);
-
-            source.onended = () => {
+            updateState("speaking");
+            startWave();
+        } else if (event.type === "underrun" || event.type === "drained") {
+            // Let the server see how the jitter buffer is coping
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                ws.send(JSON.stringify({
+                    type: "playback_stats",
+                    event: event.type,
+                    underruns: event.underruns,
+                    target_ms: event.targetMs,
+                }));
+            }
+            if (event.type === "drained") {
                 isPlaying = false;
-                if (audioQueue.length > 0) {
-                    playNextChunk();
-                } else if (!isSpeaking) {
-                    // All audio chunks have been played, and no more are coming
-                    console.log("DEBUG: All chunks played and speaking finished. Restarting microphone.");
+                if (!isSpeaking) {
+                    console.log("DEBUG: Audio stream and buffer finished. Setting to idle.");
                     updateState("idle");
-                    // Optionally restart recording here, or allow the user to click start again
                 }
-            };
-            
-            source.start(audioContext.currentTime);
-            updateState("speaking");
-            startWave();
-        } else if (isSpeaking && audioQueue.length === 0) {
-            console.log("DEBUG: Waiting for next audio chunk. Queue is empty.");
-        } else if (!isSpeaking && audioQueue.length === 0) {
-            console.log("DEBUG: Audio stream and queue finished. Setting to idle.");
-            updateState("idle");
+            }
         }
     }
 
+    function stopPlayback() {
+        isSpeaking = false;
+        isPlaying = false;
+        if (playbackNode) playbackNode.port.postMessage({ type: "clear" });
+    }
+
+    function handleAudioChunk(base64Audio, isFinal, codec, sampleRate) {
+        if (!playbackNode) {
+            console.warn("Playback worklet not ready. Dropping audio message.");
+            return;
+        }
 
-    function handleAudioChunk(base64Audio, isFinal) {
         if (isFinal) {
             isSpeaking = false;
             console.log("DEBUG: Received final audio message.");
-            // Wait for the audio queue to empty before signaling completion
-            if (audioQueue.length === 0 && !isPlaying) {
-                console.log("DEBUG: Final audio message received and queue is empty. Transition to idle/listening.");
-                updateState("idle");
-            }
+            // The worklet drains what is buffered and reports "drained"
+            playbackNode.port.postMessage({ type: "end" });
+            if (!isPlaying) updateState("idle");
             return;
         }
-        
+
         if (base64Audio) {
             isSpeaking = true;
-            console.log("DEBUG: Received new audio chunk.");
-            const float32Array = base64ToPCMFloat32(base64Audio);
-            if (float32Array) {
-                audioQueue.push(float32Array);
-                if (!isPlaying) {
-                    playNextChunk();
-                }
+            let float32Array = codec === "mulaw" ?
+                base64ToMulawFloat32(base64Audio) :
+                base64ToPCMFloat32(base64Audio);
+            const rate = sampleRate || SAMPLE_RATE;
+            if (rate !== playbackCtx.sampleRate) {
+                float32Array = resampleLinear(float32Array, rate, playbackCtx.sampleRate);
             }
+            playbackNode.port.postMessage({ type: "push", samples: float32Array }, [float32Array.buffer]);
         }
     }
 
-    function floatTo16BitPCM(float32Array) {
-        const buffer = new ArrayBuffer(float32Array.length * 2);
-        const view = new DataView(buffer);
-        let offset = 0;
-        for (let i = 0; i < float32Array.length; i++, offset += 2) {
-            let s = Math.max(-1, Math.min(1, float32Array[i]));
-            view.setInt16(offset, s < 0 ? s * 0x8000 : s * 0x7fff, true);
-        }
-        return buffer;
-    }
-
     function updateState(newState) {
         console.log("🔄 State changed:", newState);
         if (STATE_GIFS[newState]) stateGif.src = STATE_GIFS[newState];
@@ -195,57 +244,64 @@ document.addEventListener("DOMContentLoaded", () => {
         ctx.clearRect(0, 0, waveformCanvas.width, waveformCanvas.height);
     }
 
-    async function startRecording() {
-        if (isSpeaking || audioQueue.length > 0) {
-            console.log("DEBUG: Cannot start mic. Bot is still speaking or queue is not empty.");
-            return;
-        }
-
-        if (isFirstInteraction) {
-            introMessageDiv.remove();
-            isFirstInteraction = false;
-        }
+    function connectWebSocket(keys) {
+        const socket = new WebSocket(WS_URL);
+        ws = socket;
 
-        console.log("🎤 Starting recording, connecting to WebSocket:", WS_URL);
-        const aaiKey = localStorage.getItem("aaiKey");
-        const murfKey = localStorage.getItem("murfKey");
-        const tavilyKey = localStorage.getItem("tavilyKey");
-        const geminiKey = localStorage.getItem("geminiKey"); // NEW: Get Gemini Key
-
-        if (!aaiKey) {
-            alert("Please enter your AssemblyAI API key in the sidebar.");
-            return;
-        }
-
-        if (!audioContext) {
-            audioContext = new (window.AudioContext || window.webkitAudioContext)();
-            await audioContext.resume();
-            console.log("DEBUG: AudioContext created and resumed.");
-        }
-
-        ws = new WebSocket(WS_URL);
-
-        ws.onopen = () => {
+        socket.onopen = () => {
             console.log("✅ WebSocket connected");
-            ws.send(JSON.stringify({
+            socket.send(JSON.stringify({
                 type: "config",
-                aai_key: aaiKey,
-                murf_key: murfKey,
-                tavily_key: tavilyKey,
-                gemini_key: geminiKey // NEW: Send Gemini Key
+                aai_key: keys.aaiKey,
+                murf_key: keys.murfKey,
+                tavily_key: keys.tavilyKey,
+                gemini_key: keys.geminiKey, // NEW: Send Gemini Key
+                audio_sample_rate: TTS_SAMPLE_RATE,
+                audio_codec: TTS_CODEC,
+                resume_token: localStorage.getItem(SESSION_TOKEN_KEY)
             }));
             updateState("listening");
         };
-        ws.onclose = () => {
+        socket.onclose = (event) => {
             console.log("❌ WebSocket closed");
+            if (ws === socket && event.code === SESSION_TAKEN_OVER_CODE) {
+                console.warn("Session resumed in another tab, not reconnecting.");
+                stopRecording();
+                startBtn.style.display = "inline-block";
+                stopBtn.style.display = "none";
+                reconnectAttempts = 0;
+                updateState("idle");
+                return;
+            }
+            // stopRecording() clears ws first, so this only fires for unexpected drops
+            if (ws === socket && micProcessor && reconnectAttempts < RECONNECT_MAX_ATTEMPTS) {
+                const delay = Math.min(RECONNECT_MAX_DELAY_MS, RECONNECT_DELAY_MS * 2 ** reconnectAttempts);
+                reconnectAttempts++;
+                console.log(`DEBUG: Reconnecting to resume session in ${delay} ms (attempt ${reconnectAttempts}).`);
+                setTimeout(() => {
+                    if (ws === socket) connectWebSocket(keys);
+                }, delay);
+                return;
+            }
+            if (ws === socket && micProcessor) {
+                console.warn("Giving up reconnecting after", reconnectAttempts, "attempts.");
+                stopRecording();
+                startBtn.style.display = "inline-block";
+                stopBtn.style.display = "none";
+            }
+            reconnectAttempts = 0;
             updateState("idle");
         };
-        ws.onerror = (err) => console.error("⚠️ WebSocket error", err);
+        socket.onerror = (err) => console.error("⚠️ WebSocket error", err);
 
-        ws.onmessage = (event) => {
+        socket.onmessage = (event) => {
             const msg = JSON.parse(event.data);
             console.log("📩 WS message received:", msg);
-            if (msg.type === "transcript") {
+            if (msg.type === "session") {
+                reconnectAttempts = 0;
+                localStorage.setItem(SESSION_TOKEN_KEY, msg.token);
+                if (msg.resumed) console.log("♻️ Session resumed.");
+            } else if (msg.type === "transcript") {
                 currentAIBubble = null;
                 aiAccumulatedText = "";
                 awaitingLinks = false;
@@ -270,36 +326,70 @@ document.addEventListener("DOMContentLoaded", () => {
                 currentAIBubble = null;
             } else if (msg.type === "ai_audio") {
                 // Handle audio chunks and queue them
-                handleAudioChunk(msg.audio, msg.final);
+                handleAudioChunk(msg.audio, msg.final, msg.codec, msg.sample_rate);
+            } else if (msg.type === "stop_audio") {
+                stopPlayback();
             }
         };
+    }
+
+    async function startRecording() {
+        if (isSpeaking || isPlaying) {
+            console.log("DEBUG: Cannot start mic. Bot is still speaking or buffer is not empty.");
+            return;
+        }
+
+        if (isFirstInteraction) {
+            introMessageDiv.remove();
+            isFirstInteraction = false;
+        }
+
+        console.log("🎤 Starting recording, connecting to WebSocket:", WS_URL);
+        const aaiKey = localStorage.getItem("aaiKey");
+        const murfKey = localStorage.getItem("murfKey");
+        const tavilyKey = localStorage.getItem("tavilyKey");
+        const geminiKey = localStorage.getItem("geminiKey"); // NEW: Get Gemini Key
+
+        if (!aaiKey) {
+            alert("Please enter your AssemblyAI API key in the sidebar.");
+            return;
+        }
+
+        await ensurePlayback();
+
+        connectWebSocket({ aaiKey, murfKey, tavilyKey, geminiKey });
 
         stream = await navigator.mediaDevices.getUserMedia({ audio: true });
         micCtx = new AudioContext({ sampleRate: 16000 });
+        await micCtx.audioWorklet.addModule(WORKLET_URL);
         micSource = micCtx.createMediaStreamSource(stream);
-        micProcessor = micCtx.createScriptProcessor(4096, 1, 1);
-        micSource.connect(micProcessor);
-        micProcessor.connect(micCtx.destination);
-        micProcessor.onaudioprocess = (e) => {
-            const inputData = e.inputBuffer.getChannelData(0);
-            const pcm16 = floatTo16BitPCM(inputData);
-            if (ws && ws.readyState === WebSocket.OPEN) ws.send(pcm16);
+        micProcessor = new AudioWorkletNode(micCtx, "pcm-capture-processor", {
+            numberOfOutputs: 0,
+            processorOptions: { frameMs: CAPTURE_FRAME_MS },
+        });
+        micProcessor.port.onmessage = (e) => {
+            if (ws && ws.readyState === WebSocket.OPEN) ws.send(e.data);
         };
+        micSource.connect(micProcessor);
     }
 
     function stopRecording() {
-        if (ws && ws.readyState === WebSocket.OPEN) {
-            ws.close();
+        if (ws) {
+            const socket = ws;
             ws = null;
+            socket.close();
         }
         if (micProcessor) {
+            micProcessor.port.onmessage = null;
             micProcessor.disconnect();
             micSource.disconnect();
             micCtx.close();
+            micProcessor = null;
         }
         if (stream) {
             stream.getTracks().forEach(track => track.stop());
         }
+        stopPlayback();
         stopWave();
         updateState("idle");
     }
@@ -348,6 +438,8 @@ document.addEventListener("DOMContentLoaded", () => {
     });
     resetBtn.addEventListener("click", () => {
         stopRecording();
+        // A reset starts a fresh conversation on the server too
+        localStorage.removeItem(SESSION_TOKEN_KEY);
         messagesContainer.innerHTML = "";
         updateState("idle");
         startBtn.style.display = "inline-block";
@@ -361,6 +453,8 @@ document.addEventListener("DOMContentLoaded", () => {
         localStorage.setItem("murfKey", murfKeyInput.value);
         localStorage.setItem("tavilyKey", tavilyKeyInput.value);
         localStorage.setItem("geminiKey", geminiKeyInput.value); // NEW: Save Gemini Key
+        // New keys need new provider clients, so don't resume the old session
+        localStorage.removeItem(SESSION_TOKEN_KEY);
         alert("API keys saved successfully!");
     });
     